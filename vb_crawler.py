@@ -1,12 +1,17 @@
+import asyncio
+import atexit
+import logging
 import os
 import re
-import time
-from datetime import datetime, timedelta
-from urllib.parse import urljoin
+import threading
+from datetime import timezone
+from io import BytesIO
 
-import pytz
-from bs4 import BeautifulSoup
+import ciso8601
+import httpx
+import requests
 from dotenv import load_dotenv
+from lxml import etree
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
@@ -14,96 +19,214 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from supabase import create_client, Client
-from webdriver_manager.chrome import ChromeDriverManager
+from supabase import AsyncClient, acreate_client
+from supabase.lib.client_options import AsyncClientOptions
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+# 요약문 공백 정리용 정규식 (기사마다 재사용)
+_WS_RE = re.compile(r'\s+')
+
 # --- 환경 변수 및 Supabase 설정 ---
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 
-# Supabase 클라이언트 초기화
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("Supabase 클라이언트 초기화 성공")
-except Exception as e:
-    print(f"Supabase 클라이언트 초기화 실패: {e}")
-    supabase = None
+# 한 번의 PostgREST 요청에 담을 최대 행 수 / 동시에 보낼 요청 수
+UPSERT_BATCH_SIZE = 500
+UPSERT_MAX_CONCURRENCY = 4
+
+# --- 크롤링 대상 설정 ---
+BASE_URL = 'https://venturebeat.com'
+CRAWL_URL = f'{BASE_URL}/category/ai'
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER", "/usr/local/bin/chromedriver")
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
+
+# 정적 HTML 경로에서 <article> 요소마다 사용하는 미리 컴파일된 XPath
+_TITLE_XP = etree.XPath("(.//h2)[1]")
+_TITLE_LINK_XP = etree.XPath("(.//a[@href])[1]/@href")
+_SUMMARY_XP = etree.XPath("(.//p)[1]")
+_DATETIME_XP = etree.XPath("(.//time)[1]/@datetime")
+
+# 여러 번 크롤링해도 Chrome을 한 번만 띄우도록 공유하는 드라이버
+_DRIVER = None
+_DRIVER_LOCK = threading.Lock()
+
+# Selenium 사용 시 불러오지 않을 리소스 (기사 추출에 필요 없음)
+BLOCKED_URL_PATTERNS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg',
+    '*.css', '*.woff', '*.woff2', '*.ttf',
+    '*googletagmanager*', '*google-analytics*', '*doubleclick*', '*googlesyndication*',
+]
+
+# 브라우저 안에서 기사 목록을 바로 추출하는 스크립트 (page_source 직렬화/재파싱 생략)
+EXTRACT_ARTICLES_JS = """
+return Array.from(document.querySelectorAll('article')).map(a => {
+    const h2 = a.querySelector('h2');
+    const link = h2 ? h2.querySelector('a[href]') : null;
+    if (!link) return null;
+    const p = a.querySelector('p');
+    const t = a.querySelector('time');
+    return {
+        title: h2.innerText.trim(),
+        href: link.href,
+        summary: p ? p.innerText.trim() : '',
+        datetime: t ? t.getAttribute('datetime') : null
+    };
+}).filter(x => x);
+"""
+
+def _element_text(el):
+    """요소의 하위 텍스트를 이어 붙여 반환합니다 (iterparse 요소에는 text_content()가 없음)."""
+    return ''.join(el.itertext()).strip()
+
+
+def _parse_article(article_el):
+    """<article> 요소 하나에서 기사 레코드를 추출합니다. 첫 번째 h2에 링크가 없으면 None."""
+    title_tags = _TITLE_XP(article_el)
+    links = _TITLE_LINK_XP(title_tags[0]) if title_tags else []
+    if not links:
+        return None
 
-def crawl_venturebeat():
-    """VentureBeat AI 카테고리 기사 목록을 크롤링합니다."""
-    BASE_URL = 'https://venturebeat.com'
-    CRAWL_URL = f'{BASE_URL}/category/ai'
-    print("DEBUG: crawl_venturebeat 함수 시작")
+    # VentureBeat 링크는 절대 URL 또는 '/'로 시작하는 경로이므로 urljoin 없이 붙입니다.
+    href = links[0]
+    if not href.startswith('http'):
+        href = BASE_URL + href
+
+    summary_tags = _SUMMARY_XP(article_el)
+    datetimes = _DATETIME_XP(article_el)
+    return {
+        'title': _element_text(title_tags[0]),
+        'href': href,
+        'summary': _element_text(summary_tags[0]) if summary_tags else '',
+        'datetime': datetimes[0] if datetimes else None
+    }
+
+
+def fetch_records_static():
+    """Selenium 없이 requests + lxml로 서버 렌더링된 기사 목록을 추출합니다."""
+    response = requests.get(CRAWL_URL, headers={'User-Agent': USER_AGENT}, timeout=10)
+    response.raise_for_status()
+
+    # 전체 DOM을 만들지 않고 <article> 단위로 스트리밍 파싱 후 바로 해제합니다.
+    context = etree.iterparse(BytesIO(response.content), tag='article', html=True, huge_tree=True)
+
+    records = []
+    for _, article_el in context:
+        record = _parse_article(article_el)
+        if record:
+            records.append(record)
+
+        article_el.clear()
+        while article_el.getprevious() is not None:
+            del article_el.getparent()[0]
+    return records
+
+
+def _quit_driver():
+    """프로세스 종료 시 공유 Chrome 드라이버를 정리합니다."""
+    global _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER:
+            _DRIVER.quit()
+            _DRIVER = None
+
+
+def get_driver():
+    """모듈 단위로 공유되는 Chrome 드라이버를 최초 호출 시에만 생성해 반환합니다."""
+    global _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER is None:
+            chrome_options = Options()
+            # DOMContentLoaded까지만 기다리고, 기사 존재 여부는 WebDriverWait로 확인합니다.
+            chrome_options.page_load_strategy = 'eager'
+            chrome_options.add_argument("--headless=new")
+            chrome_options.add_argument("--no-sandbox")
+            chrome_options.add_argument("--disable-dev-shm-usage")
+            chrome_options.add_argument(f"user-agent={USER_AGENT}")
+            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+            chrome_options.add_experimental_option('useAutomationExtension', False)
+            chrome_options.add_experimental_option("prefs", {
+                "profile.managed_default_content_settings.images": 2,
+            })
+
+            # 이미지/러너에 설치된 chromedriver를 직접 사용합니다 (webdriver_manager 버전 확인 생략).
+            service = Service(executable_path=CHROMEDRIVER_PATH)
+            _DRIVER = webdriver.Chrome(service=service, options=chrome_options)
+            # 기사 데이터와 무관한 이미지/CSS/폰트/광고 요청은 네트워크 단계에서 차단합니다.
+            _DRIVER.execute_cdp_cmd('Network.enable', {})
+            _DRIVER.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+            atexit.register(_quit_driver)
+        return _DRIVER
+
+
+def fetch_records_selenium():
+    """JS 렌더링이 필요한 경우 Selenium으로 기사 목록을 추출합니다."""
+    driver = get_driver()
+    driver.get(CRAWL_URL)
 
-    if not supabase:
-        print("DEBUG: Supabase 클라이언트가 유효하지 않아 크롤링을 중단합니다.")
+    try:
+        WebDriverWait(driver, 60).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "article"))
+        )
+    except TimeoutException:
+        print("DEBUG: 기사 목록 컨테이너 로드 시간 초과.")
+        driver.save_screenshot('debug_screenshot.png')
+        print("DEBUG: 타임아웃 발생 시점의 스크린샷을 'debug_screenshot.png'로 저장했습니다.")
         return None
 
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
+    return driver.execute_script(EXTRACT_ARTICLES_JS)
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
 
-    try:
-        driver.get(CRAWL_URL)
+def crawl_venturebeat():
+    """VentureBeat AI 카테고리 기사 목록을 크롤링합니다."""
+    print("DEBUG: crawl_venturebeat 함수 시작")
 
+    try:
+        # 요청 실패뿐 아니라 빈/깨진 응답 등 파싱 오류도 모두 Selenium 경로로 넘깁니다.
         try:
-            WebDriverWait(driver, 60).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "article"))
-            )
-        except TimeoutException:
-            print("DEBUG: 기사 목록 컨테이너 로드 시간 초과.")
-            driver.save_screenshot('debug_screenshot.png')
-            print("DEBUG: 타임아웃 발생 시점의 스크린샷을 'debug_screenshot.png'로 저장했습니다.")
-            return None
+            records = fetch_records_static()
+        except Exception as static_err:
+            print(f"DEBUG: 정적 HTML 처리 실패: {static_err}")
+            records = []
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        if not records:
+            print("DEBUG: 정적 HTML에서 기사를 찾지 못해 Selenium으로 전환합니다.")
+            records = fetch_records_selenium()
+            if records is None:
+                return None
 
         articles = []
-        utc = pytz.utc
-
-        article_elements = soup.find_all('article')
+        # 같은 기사가 여러 블록에 노출되는 경우가 있어 링크 기준으로 바로 중복을 제거합니다.
+        seen_links = set()
 
-        for article_el in article_elements:
-            title_tag = article_el.find('h2')
-            if not title_tag or not title_tag.find('a'):
+        for record in records:
+            title = record['title']
+            absolute_link = record['href']
+            if absolute_link in seen_links:
                 continue
+            summary = record['summary']
 
-            title = title_tag.get_text(strip=True)
-            relative_link = title_tag.find('a')['href']
-            absolute_link = urljoin(BASE_URL, relative_link)
-
-            summary_tag = article_el.find('p')
-            summary = summary_tag.get_text(strip=True) if summary_tag else ""
-
-            date_tag = article_el.find('time')
-            if date_tag and date_tag.has_attr('datetime'):
-                date_str = date_tag['datetime']
+            date_str = record['datetime']
+            if date_str:
                 try:
-                    article_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+                    article_date = ciso8601.parse_datetime(date_str)
 
                     if article_date.tzinfo is None:
-                        article_date = utc.localize(article_date)
+                        article_date = article_date.replace(tzinfo=timezone.utc)
 
                     articles.append({
                         'title': title,
                         'link': absolute_link,
-                        'summary': re.sub(r'\s+', ' ', summary),
+                        'summary': _WS_RE.sub(' ', summary),
                         'published_at': article_date.isoformat(),
                         'source': 'VentureBeat'
                     })
+                    seen_links.add(absolute_link)
                 except ValueError as ve:
-                    print(f"DEBUG: 날짜 파싱 오류: {date_str} - {ve}")
+                    log.debug("날짜 파싱 오류: %s - %s", date_str, ve)
                     continue
 
         print(f"총 {len(articles)}개의 기사를 수집했습니다.")
@@ -113,64 +236,84 @@ def crawl_venturebeat():
     except Exception as e:
         print(f"DEBUG: 크롤링 중 오류 발생: {e}")
         return None
-    finally:
-        if driver:
-            driver.quit()
 
 
-def save_to_supabase(articles):
+async def create_supabase_client(http_client):
+    """비동기 Supabase 클라이언트를 초기화합니다. 실패하면 None을 반환합니다."""
+    try:
+        options = AsyncClientOptions(httpx_client=http_client)
+        client: AsyncClient = await acreate_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+        print("Supabase 클라이언트 초기화 성공")
+        return client
+    except Exception as e:
+        print(f"Supabase 클라이언트 초기화 실패: {e}")
+        return None
+
+
+async def _upsert_batch(client, batch, semaphore):
+    """기사 묶음 하나를 upsert하고 새로 저장된 행 수를 반환합니다."""
+    async with semaphore:
+        # link 유니크 인덱스 기준으로 DB가 중복을 걸러내므로 별도 조회 없이 바로 upsert
+        response = await client.table('articles').upsert(
+            batch, on_conflict='link', ignore_duplicates=True
+        ).execute()
+    return len(response.data) if response.data else 0
+
+
+async def save_to_supabase(client, articles):
     """크롤링한 기사를 Supabase DB에 저장합니다."""
     if not articles:
         print("DB에 저장할 기사가 없습니다.")
         return
 
-    if not supabase:
+    if not client:
         print("Supabase 클라이언트가 유효하지 않아 저장을 건너뜁니다.")
         return
 
-    # 크롤링한 기사들의 링크 목록
-    crawled_links = {article['link'] for article in articles}
-
     try:
-        # DB에 이미 저장된 기사들의 링크 조회
-        existing_links_response = supabase.table('articles').select('link').in_('link', list(crawled_links)).execute()
-        if existing_links_response.data:
-            existing_links = {item['link'] for item in existing_links_response.data}
-            print(f"DB에서 {len(existing_links)}개의 기존 기사 링크를 확인했습니다.")
-        else:
-            existing_links = set()
-            print("DB에 일치하는 기존 기사가 없습니다.")
+        print(f"{len(articles)}개의 기사를 Supabase DB에 저장을 시도합니다.")
 
-        # DB에 없는 새로운 기사만 필터링
-        new_articles = [article for article in articles if article['link'] not in existing_links]
-
-        if not new_articles:
-            print("저장할 새로운 기사가 없습니다.")
-            return
+        # 요청 하나가 너무 커지지 않도록 UPSERT_BATCH_SIZE 단위로 나눠 동시에 전송
+        semaphore = asyncio.Semaphore(UPSERT_MAX_CONCURRENCY)
+        batches = [articles[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(articles), UPSERT_BATCH_SIZE)]
+        saved_counts = await asyncio.gather(*(_upsert_batch(client, batch, semaphore) for batch in batches))
+        saved_count = sum(saved_counts)
 
-        print(f"{len(new_articles)}개의 새로운 기사를 Supabase DB에 저장을 시도합니다.")
-
-        # 새로운 기사만 upsert
-        response = supabase.table('articles').upsert(new_articles, on_conflict='link').execute()
-        print(f"Supabase 저장 응답: {response}")
-        if response.data:
-            print(f"Supabase 저장 완료: {len(response.data)}개 행이 처리되었습니다.")
+        if saved_count:
+            print(f"Supabase 저장 완료: {saved_count}개의 새로운 기사가 저장되었습니다.")
         else:
-            # 이 경우는 보통 에러가 없으면 발생하지 않지만, 디버깅을 위해 남겨둡니다.
-            print(f"Supabase에 데이터가 저장되지 않았습니다. 응답: {response}")
+            print("저장할 새로운 기사가 없습니다.")
 
     except Exception as e:
         print(f"Supabase 처리 중 오류 발생: {e}")
 
 
-if __name__ == "__main__":
+async def main():
     print("DEBUG: 메인 스크립트 시작")
-    crawled_articles = crawl_venturebeat()
-
-    if crawled_articles:
-        print("DEBUG: Supabase 저장 함수 호출 전")
-        save_to_supabase(crawled_articles)
-        print("DEBUG: Supabase 저장 함수 호출 후")
-    else:
-        print("DEBUG: 크롤링된 기사가 없어 Supabase 저장을 건너뜁니다.")
+
+    # keep-alive 한도를 지정하기 위해 httpx 클라이언트를 직접 구성합니다.
+    # 직접 넘기면 postgrest 기본 설정(120초 타임아웃, 리다이렉트 추적)이 적용되지 않으므로 동일하게 맞춥니다.
+    async with httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(120),
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=UPSERT_MAX_CONCURRENCY, keepalive_expiry=60),
+    ) as http_client:
+        # 블로킹 크롤링은 스레드에서 실행하고, 그동안 Supabase 클라이언트 초기화를 함께 진행합니다.
+        supabase, crawled_articles = await asyncio.gather(
+            create_supabase_client(http_client),
+            asyncio.to_thread(crawl_venturebeat),
+        )
+
+        if crawled_articles:
+            print("DEBUG: Supabase 저장 함수 호출 전")
+            await save_to_supabase(supabase, crawled_articles)
+            print("DEBUG: Supabase 저장 함수 호출 후")
+        else:
+            print("DEBUG: 크롤링된 기사가 없어 Supabase 저장을 건너뜁니다.")
     print("DEBUG: 메인 스크립트 종료")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())